@@ -1,12 +1,21 @@
 import os
-import json
+import hashlib
+import hmac
 import sqlite3
+import atexit
+import queue
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+import orjson
+import redis
 import stripe
 import smtplib
 from email.message import EmailMessage
 from dotenv import load_dotenv
-from flask import Flask, render_template, session, redirect, url_for, request, flash
+from flask import Flask, Response, abort, render_template, stream_template, session, redirect, url_for, request, flash
 from flask_session import Session
+from flask_compress import Compress
 
 # Load environment variables
 load_dotenv()
@@ -14,9 +23,44 @@ load_dotenv()
 # ----------------- Flask Setup -----------------
 app = Flask(__name__, static_folder="static", template_folder="templates")
 app.secret_key = os.getenv("SECRET_KEY", "dev-secret-key")
-app.config["SESSION_TYPE"] = "filesystem"
+app.config["SESSION_TYPE"] = "redis"
+app.config["SESSION_REDIS"] = redis.Redis.from_url(
+    os.getenv("REDIS_URL", "redis://localhost:6379/0")
+)
 app.config["SESSION_PERMANENT"] = False
 Session(app)
+# Static files get far-future cache headers; HTML responses are compressed.
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 31536000
+
+
+class IndexCompressCache:
+    # Keeps the compressed index page per Accept-Encoding value so it is only
+    # compressed once. Other responses get no key and are compressed as usual.
+    MAX_ENTRIES = 16
+
+    def __init__(self):
+        self._data = {}
+
+    def get(self, key):
+        return self._data.get(key) if key else None
+
+    def set(self, key, value):
+        if key and (key in self._data or len(self._data) < self.MAX_ENTRIES):
+            self._data[key] = value
+
+
+def index_compress_cache_key(req):
+    if req.endpoint == "index":
+        return "index:" + req.headers.get("Accept-Encoding", "")
+    return None
+
+
+app.config["COMPRESS_CACHE_BACKEND"] = IndexCompressCache
+app.config["COMPRESS_CACHE_KEY"] = index_compress_cache_key
+# Compressing a streamed response buffers all of it, which would undo the
+# streaming of the admin page.
+app.config["COMPRESS_STREAMS"] = False
+Compress(app)
 
 # ----------------- Stripe Setup -----------------
 STRIPE_SECRET = os.getenv("STRIPE_SECRET_KEY", "")
@@ -24,9 +68,33 @@ STRIPE_PUBLISHABLE = os.getenv("STRIPE_PUBLISHABLE_KEY", "")
 if STRIPE_SECRET:
     stripe.api_key = STRIPE_SECRET
 
+# ----------------- App Settings -----------------
+# Read once at startup rather than from os.environ on every request.
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123").encode()
+EMAIL_USER = os.getenv("EMAIL_USER")
+EMAIL_PASS = os.getenv("EMAIL_PASS")
+WHATSAPP_NUMBER = os.getenv("WHATSAPP_NUMBER", "91XXXXXXXXXX")  # fallback number
+
 # ----------------- Database Setup -----------------
 DB_PATH = "orders.db"
 
+# Kept as constants so the pooled connection's statement cache reuses the
+# compiled statements across requests.
+INSERT_ORDER_SQL = (
+    "INSERT INTO orders (customer_name,email,phone,address,delivery_type,items,total,paid) "
+    "VALUES (?,?,?,?,?,?,?,?)"
+)
+INSERT_ORDER_ITEM_SQL = (
+    "INSERT INTO order_items (order_id,pid,qty,price) VALUES (?,?,?,?)"
+)
+SELECT_ORDERS_SQL = (
+    "SELECT id,customer_name,email,phone,address,delivery_type,items,total,paid "
+    "FROM orders ORDER BY id DESC LIMIT ? OFFSET ?"
+)
+ADMIN_PAGE_SIZE = 50
+# Keeps the OFFSET within SQLite's 64-bit integer range for any ?page= value.
+ADMIN_MAX_PAGE = 1_000_000
+
 
 def init_db():
     conn = sqlite3.connect(DB_PATH)
@@ -46,29 +114,149 @@ def init_db():
         )
     """
     )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL REFERENCES orders(id),
+            pid INTEGER,
+            qty INTEGER,
+            price REAL
+        )
+    """
+    )
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id)"
+    )
     conn.commit()
     conn.close()
 
 
 init_db()
 
+# One connection per worker thread, tuned once on first use and reused
+# across requests instead of reconnecting every time.
+_local = threading.local()
+_pool = []
+_pool_lock = threading.Lock()
+
+
+def get_conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        # Autocommit mode: transactions are opened explicitly by write_tx().
+        conn = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")
+        _local.conn = conn
+        with _pool_lock:
+            _pool.append(conn)
+    return conn
+
+
+@contextmanager
+def write_tx(conn):
+    # BEGIN IMMEDIATE takes the write lock up front, so a busy database waits
+    # on busy_timeout instead of failing when a deferred read upgrades.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def insert_order_and_items(conn, order_row, item_rows):
+    # Order and item rows go in one transaction, so one commit for all.
+    with write_tx(conn):
+        cur = conn.execute(INSERT_ORDER_SQL, order_row)
+        order_id = cur.lastrowid
+        conn.executemany(
+            INSERT_ORDER_ITEM_SQL, [(order_id, *row) for row in item_rows]
+        )
+    return order_id
+
+
+@atexit.register
+def close_pool():
+    with _pool_lock:
+        while _pool:
+            _pool.pop().close()
+
 # ----------------- Load Products -----------------
+Product = namedtuple("Product", "id name price price_paise image description")
+
 try:
-    with open("products.json", "r", encoding="utf-8") as f:
-        PRODUCTS = json.load(f)
+    with open("products.json", "rb") as f:
+        raw_products = orjson.loads(f.read())
 except FileNotFoundError:
-    PRODUCTS = []
-except json.JSONDecodeError as e:
+    raw_products = []
+except orjson.JSONDecodeError as e:
     print(f"Error parsing products.json: {e}")
-    PRODUCTS = []
+    raw_products = []
+
+# Normalize once here so request handlers can trust the types.
+PRODUCTS = [
+    Product(
+        id=int(p["id"]),
+        name=p["name"],
+        price=p["price"],
+        price_paise=p.get("price_paise", round(p["price"] * 100)),
+        image=p.get("image", ""),
+        description=p.get("description", ""),
+    )
+    for p in raw_products
+]
+del raw_products
+
+PRODUCTS_BY_ID = {p.id: p for p in PRODUCTS}
+
+# Stripe line-item parts that never change per product; checkout only adds
+# the quantity. Shared between requests, so treat as read-only.
+STRIPE_PRICE_DATA = {
+    p.id: {
+        "price_data": {
+            "currency": "inr",
+            "product_data": {"name": p.name},
+            "unit_amount": p.price_paise,
+        }
+    }
+    for p in PRODUCTS
+}
 
 
 # ----------------- Utility Functions -----------------
-def get_product(pid):
-    for p in PRODUCTS:
-        if p["id"] == int(pid):
-            return p
-    return None
+# orjson returns bytes; the items column is TEXT, so decode on the way in.
+def _dumps(obj):
+    return orjson.dumps(obj).decode()
+
+
+_loads = orjson.loads
+
+
+def build_cart_view(cart):
+    items = []
+    total = 0
+    for pid, qty in cart.items():
+        p = PRODUCTS_BY_ID.get(int(pid))
+        if p:
+            subtotal = p.price * qty
+            items.append(
+                {
+                    "id": p.id,
+                    "name": p.name,
+                    "price": p.price,
+                    "qty": qty,
+                    "subtotal": subtotal,
+                }
+            )
+            total += subtotal
+    return items, total
 
 
 @app.context_processor
@@ -77,53 +265,57 @@ def inject_publishable_key():
 
 
 # ----------------- Routes -----------------
+# The catalog is loaded once at startup, so the index page only needs to be
+# rendered once per process.
+_INDEX_HTML = None
+_INDEX_ETAG = None
+
+
 @app.route("/")
 def index():
-    return render_template("index.html", products=PRODUCTS)
+    global _INDEX_HTML, _INDEX_ETAG
+    if _INDEX_HTML is None:
+        _INDEX_HTML = render_template("index.html", products=PRODUCTS)
+        _INDEX_ETAG = hashlib.sha1(_INDEX_HTML.encode()).hexdigest()
+    # Compress suffixes the ETag with the encoding (e.g. ":gzip"), so strip
+    # that before checking whether the client's copy is still current.
+    if _INDEX_ETAG in {tag.split(":", 1)[0] for tag in request.if_none_match}:
+        resp = Response(status=304)
+    else:
+        resp = Response(_INDEX_HTML, mimetype="text/html")
+    resp.set_etag(_INDEX_ETAG)
+    return resp
 
 
 @app.route("/add-to-cart/<int:pid>")
 def add_to_cart(pid):
-    prod = get_product(pid)
+    # Unknown ids are mostly bots; 404 without flashing so no session write.
+    prod = PRODUCTS_BY_ID.get(pid)
     if not prod:
-        flash("Product not found", "error")
-        return redirect(url_for("index"))
+        abort(404)
     cart = session.get("cart", {})
     cart[str(pid)] = cart.get(str(pid), 0) + 1
     session["cart"] = cart
-    flash(f"Added {prod['name']} to cart", "success")
+    flash(f"Added {prod.name} to cart", "success")
     return redirect(url_for("index"))
 
 
 @app.route("/cart")
 def cart():
-    cart = session.get("cart", {})
-    items = []
-    total = 0
-    for pid, qty in cart.items():
-        p = get_product(pid)
-        if p:
-            p_copy = p.copy()
-            p_copy["qty"] = qty
-            p_copy["subtotal"] = p_copy["price"] * qty
-            items.append(p_copy)
-            total += p_copy["subtotal"]
+    items, total = build_cart_view(session.get("cart", {}))
     return render_template("cart.html", items=items, total=total)
 
 
 @app.route("/update-cart", methods=["POST"])
 def update_cart():
-    data = request.form
     cart = {}
-    for key in data:
-        if key.startswith("qty-"):
-            pid = key.split("-", 1)[1]
-            try:
-                qty = int(data.get(key, 0))
-            except ValueError:
-                qty = 0
-            if qty > 0:
-                cart[pid] = qty
+    for key, val in request.form.items():
+        if not key.startswith("qty-"):
+            continue
+        # isdecimal() rather than isdigit(): it only passes strings int() accepts.
+        val = val.strip()
+        if val.isdecimal() and (qty := int(val)) > 0:
+            cart[key[4:]] = qty
     session["cart"] = cart
     return redirect(url_for("cart"))
 
@@ -132,18 +324,9 @@ def update_cart():
 def checkout():
     cart = session.get("cart", {})
     if not cart:
-        flash("Your cart is empty", "error")
         return redirect(url_for("index"))
-    
-    items = []
-    total = 0
-    for pid, qty in cart.items():
-        p = get_product(pid)
-        if p:
-            items.append(
-                {"id": p["id"], "name": p["name"], "price": p["price"], "qty": qty}
-            )
-            total += p["price"] * qty
+
+    items, total = build_cart_view(cart)
 
     if request.method == "GET":
         return render_template("checkout.html", items=items, total=total)
@@ -161,37 +344,24 @@ def checkout():
         return redirect(url_for("checkout"))
 
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute(
-            "INSERT INTO orders (customer_name,email,phone,address,delivery_type,items,total,paid) VALUES (?,?,?,?,?,?,?,?)",
-            (name, email, phone, address, delivery_type, json.dumps(items), total, 0),
+        order_id = insert_order_and_items(
+            get_conn(),
+            (name, email, phone, address, delivery_type, _dumps(items), total, 0),
+            [(it["id"], it["qty"], it["price"]) for it in items],
         )
-        order_id = c.lastrowid
-        conn.commit()
-        conn.close()
     except sqlite3.Error as e:
         flash(f"Database error: {e}", "error")
         return redirect(url_for("checkout"))
 
     session.pop("cart", None)
 
-    send_order_email(email, name, order_id, items, total, delivery_type)
+    queue_order_email(email, name, order_id, items, total, delivery_type)
 
     if pay_method == "stripe" and STRIPE_SECRET:
         try:
-            line_items = []
-            for it in items:
-                line_items.append(
-                    {
-                        "price_data": {
-                            "currency": "inr",
-                            "product_data": {"name": it["name"]},
-                            "unit_amount": int(it["price"] * 100),
-                        },
-                        "quantity": it["qty"],
-                    }
-                )
+            line_items = [
+                {**STRIPE_PRICE_DATA[it["id"]], "quantity": it["qty"]} for it in items
+            ]
             session_stripe = stripe.checkout.Session.create(
                 payment_method_types=["card"],
                 line_items=line_items,
@@ -216,44 +386,134 @@ def success():
 
 @app.route("/admin")
 def admin():
-    admin_pass = os.getenv("ADMIN_PASSWORD", "admin123")
     p = request.args.get("p")
-    if p != admin_pass:
+    if not p or not hmac.compare_digest(p.encode(), ADMIN_PASSWORD):
         return render_template("admin.html", orders=None, denied=True)
     
+    page = min(max(request.args.get("page", 1, type=int), 1), ADMIN_MAX_PAGE)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute(
-            "SELECT id,customer_name,email,phone,address,delivery_type,items,total,paid FROM orders ORDER BY id DESC"
+        conn = get_conn()
+        # Fetch one extra row to know whether there is a next page.
+        c = conn.execute(
+            SELECT_ORDERS_SQL, (ADMIN_PAGE_SIZE + 1, (page - 1) * ADMIN_PAGE_SIZE)
+        )
+        pager = {"has_next": False, "error": False}
+
+        # Rows are decoded and rendered as the cursor yields them, so only
+        # one order is held in memory at a time. This runs after admin() has
+        # returned, so errors are handled here, not by the except below.
+        def order_iter():
+            try:
+                for i, r in enumerate(c):
+                    if i == ADMIN_PAGE_SIZE:
+                        pager["has_next"] = True
+                        break
+                    try:
+                        items = _loads(r["items"])
+                    except orjson.JSONDecodeError as e:
+                        print(f"Bad items in order {r['id']}: {e}")
+                        items = None
+                    yield {**dict(r), "items": items}
+            except sqlite3.Error as e:
+                print(f"Database error in admin: {e}")
+                pager["error"] = True
+
+        return app.response_class(
+            stream_template(
+                "admin.html", orders=order_iter(), denied=False, page=page, pager=pager
+            ),
+            mimetype="text/html",
         )
-        rows = c.fetchall()
-        conn.close()
-        orders = []
-        for r in rows:
-            orders.append(
-                {
-                    "id": r[0],
-                    "customer_name": r[1],
-                    "email": r[2],
-                    "phone": r[3],
-                    "address": r[4],
-                    "delivery_type": r[5],
-                    "items": json.loads(r[6]),
-                    "total": r[7],
-                    "paid": r[8],
-                }
-            )
-        return render_template("admin.html", orders=orders, denied=False)
     except sqlite3.Error as e:
+        # Only the query itself can fail here; see order_iter() for the rest.
         print(f"Database error in admin: {e}")
-        return render_template("admin.html", orders=None, denied=False)
+        return render_template(
+            "admin.html",
+            orders=None,
+            denied=False,
+            page=page,
+            pager={"has_next": False, "error": True},
+        )
 
 
 # ----------------- Email Sending -----------------
+# Order emails are sent from a background thread so checkout doesn't wait on
+# SMTP. The worker keeps its SMTP connection open between emails.
+EMAIL_Q = queue.Queue()
+_email_thread = None
+_email_thread_lock = threading.Lock()
+_smtp = None  # only used by the email worker thread
+SMTP_KEEPALIVE_SECONDS = 120
+
+ORDER_EMAIL_HEADER = (
+    "Hello {name},\n\nThank you for your order.\nOrder ID: {order_id}\n"
+    "Delivery: {delivery_type}\nTotal: {total}\n\nItems:\n"
+)
+ORDER_EMAIL_FOOTER = "\nWe will contact you soon.\n\nRegards,\nCracker Shop"
+
+
+def queue_order_email(*args):
+    global _email_thread
+    # Started lazily so it runs in the serving process, not a pre-fork parent.
+    with _email_thread_lock:
+        if _email_thread is None or not _email_thread.is_alive():
+            _email_thread = threading.Thread(target=_email_worker, daemon=True)
+            _email_thread.start()
+    EMAIL_Q.put(args)
+
+
+def _email_worker():
+    while True:
+        try:
+            args = EMAIL_Q.get(timeout=SMTP_KEEPALIVE_SECONDS)
+        except queue.Empty:
+            _smtp_keepalive()
+            continue
+        try:
+            send_order_email(*args)
+        finally:
+            EMAIL_Q.task_done()
+
+
+def _smtp_close():
+    global _smtp
+    if _smtp is not None:
+        try:
+            _smtp.close()
+        except Exception:
+            pass
+        _smtp = None
+
+
+def _smtp_keepalive():
+    # Ping the idle connection so the server doesn't drop it between orders.
+    if _smtp is not None:
+        try:
+            _smtp.noop()
+        except OSError:
+            _smtp_close()
+
+
+def _smtp_send(msg, user, password):
+    global _smtp
+    for attempt in range(2):
+        try:
+            if _smtp is None:
+                _smtp = smtplib.SMTP_SSL("smtp.gmail.com", 465)
+                _smtp.login(user, password)
+            _smtp.send_message(msg)
+            return
+        except smtplib.SMTPServerDisconnected:
+            # Server dropped the idle connection; reconnect once and retry.
+            _smtp_close()
+            if attempt:
+                raise
+        except Exception:
+            _smtp_close()
+            raise
+
+
 def send_order_email(to_email, customer_name, order_id, items, total, delivery_type):
-    EMAIL_USER = os.getenv("EMAIL_USER")
-    EMAIL_PASS = os.getenv("EMAIL_PASS")
     if not EMAIL_USER or not EMAIL_PASS or not to_email:
         return False
     try:
@@ -261,14 +521,18 @@ def send_order_email(to_email, customer_name, order_id, items, total, delivery_t
         msg["Subject"] = f"Order Confirmation #{order_id} - Cracker Shop"
         msg["From"] = EMAIL_USER
         msg["To"] = to_email
-        body = f"Hello {customer_name},\n\nThank you for your order.\nOrder ID: {order_id}\nDelivery: {delivery_type}\nTotal: {total}\n\nItems:\n"
-        for it in items:
-            body += f"- {it['name']} x{it['qty']} @ {it['price']}\n"
-        body += "\nWe will contact you soon.\n\nRegards,\nCracker Shop"
+        body = (
+            ORDER_EMAIL_HEADER.format(
+                name=customer_name,
+                order_id=order_id,
+                delivery_type=delivery_type,
+                total=total,
+            )
+            + "".join(f"- {it['name']} x{it['qty']} @ {it['price']}\n" for it in items)
+            + ORDER_EMAIL_FOOTER
+        )
         msg.set_content(body)
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-            smtp.login(EMAIL_USER, EMAIL_PASS)
-            smtp.send_message(msg)
+        _smtp_send(msg, EMAIL_USER, EMAIL_PASS)
         return True
     except Exception as e:
         print("Email send failed:", e)
@@ -278,10 +542,16 @@ def send_order_email(to_email, customer_name, order_id, items, total, delivery_t
 def inject_globals():
     return dict(
         STRIPE_PUBLISHABLE=STRIPE_PUBLISHABLE,
-        WHATSAPP_NUMBER=os.getenv("WHATSAPP_NUMBER", "91XXXXXXXXXX")  # fallback number
+        WHATSAPP_NUMBER=WHATSAPP_NUMBER,
     )
 
 
 # ----------------- Run App -----------------
+# Production runs under gunicorn (see gunicorn_conf.py); this is for local
+# development only. Set FLASK_DEV=1 for the debugger and reloader.
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=int(os.getenv("PORT", 5000)))
+    app.run(
+        debug=bool(os.getenv("FLASK_DEV")),
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", 5000)),
+    )
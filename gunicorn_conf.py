@@ -0,0 +1,13 @@
+import multiprocessing
+import os
+
+# ----------------- Gunicorn Settings -----------------
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+
+# Load app.py once in the master so the product catalog is shared
+# copy-on-write across workers. Per-process state (SQLite connections,
+# the email worker thread) is created lazily after the fork.
+preload_app = True